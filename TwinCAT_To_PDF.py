@@ -11,151 +11,318 @@
 import os
 import sys
 import re
-import xml.etree.ElementTree as ET
-from pathlib import Path
+import importlib.util
+import subprocess
+import tempfile
+import textwrap
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, XPreformatted, Spacer, PageBreak, Table, TableStyle
 from reportlab.lib import colors
 from reportlab.lib.units import cm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+try:
+    from lxml import etree as ET
+    HAS_LXML = True
+except ImportError:  # Fall back to the standard library parser
+    import xml.etree.ElementTree as ET
+    HAS_LXML = False
+
+# File extensions of TwinCAT PLC files
+TWINCAT_EXTENSIONS = ('.TcPOU', '.TcDUT', '.TcGVL', '.TcIO')
+
+# Number of files extracted per worker task
+EXTRACT_BATCH_SIZE = 16
+
+# Structured Text keywords highlighted in the PDF
+KEYWORDS = (
+    '__UXINT', '__XINT', '__XWORD', 'BIT', 'BOOL', 'BYTE', 'DATE', 'DATE_AND_TIME',
+    'DINT', 'DT', 'DWORD', 'INT', 'LDATE', 'LDATE_AND_TIME', 'LDT', 'LINT',
+    'LREAL', 'LTIME', 'LTOD', 'LWORD', 'REAL', 'SINT', 'STRING', 'TIME',
+    'TOD', 'TIME_OF_DAY', 'UDINT', 'UINT', 'ULINT', 'USINT', 'WORD', 'WSTRING',
+    'FUNCTION_BLOCK', 'PROGRAM', 'IMPLEMENTS', 'INTERFACE', 'VAR', 'END_VAR', 'EXTENDS',
+    'PROPERTY', 'TYPE', 'END_TYPE', 'STRUCT', 'END_STRUCT', 'POINTER', 'TO', 'DO',
+    'FOR', 'END_FOR', 'END_IF', 'IF', 'AND', 'AND_THEN', 'OR_ELSE', 'ELSE', 'WHILE',
+    'REPEAT', 'UNTIL', 'CASE', 'OF', 'ADR', 'XOR', 'VAR_INPUT', 'VAR_OUTPUT', 'PERSISTENT', 'UPPER_BOUND',
+    'RETAIN', 'AT', 'ARRAY', 'METHOD', 'THIS', 'NOT', 'THEN', 'ELSIF', 'LOWER_BOUND',
+    'REFERENCE', 'REF=', 'PUBLIC', 'PRIVATE', 'CONSTANT', 'VAR_GLOBAL', 'RETURN', 'VAR_IN_OUT', 'EXIT',
+    'END_CASE', 'FUNCTION'
+)
+
+# All keywords in one alternation so each line is scanned only once
+KEYWORD_PATTERN = re.compile(r'\b(?:' + '|'.join(map(re.escape, KEYWORDS)) + r')\b')
+
+# Escapes the characters that have a meaning in reportlab's paragraph markup
+XML_ESCAPE_TABLE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+# Words of all keywords, used to quickly rule out code without any keyword
+WORD_PATTERN = re.compile(r'\w+')
+KEYWORD_WORDS = frozenset(WORD_PATTERN.findall(' '.join(KEYWORDS)))
+
+# Markup wrapped around (keyword, comment) for reportlab paragraphs and for HTML
+PDF_MARKUP = ('<font color="blue">{}</font>', '<font color="green">{}</font>')
+HTML_MARKUP = ('<span class="kw">{}</span>', '<span class="cm">{}</span>')
+
+@lru_cache(maxsize=None)
+def highlight_line(line, markup=PDF_MARKUP):
+    """Escape a line of code and highlight it, cached since many lines repeat."""
+    keyword_markup, comment_markup = markup
+    # Split off the comment in one scan, all parts are empty strings if there is none
+    code_part, sep, comment_part = line.translate(XML_ESCAPE_TABLE).partition('//')
+    # Most code contains no keyword at all, skip the regex for it
+    if not KEYWORD_WORDS.isdisjoint(WORD_PATTERN.findall(code_part)):
+        code_part = KEYWORD_PATTERN.sub(lambda match: keyword_markup.format(match.group(0)), code_part)
+    if sep:
+        code_part += comment_markup.format('//' + comment_part)
+    return code_part.strip()
+
+def highlight_code(code, markup=PDF_MARKUP, width=None):
+    """Highlight a block of code line by line, keeping the indentation of each line.
+    
+    With a width, longer lines are broken into pieces of at most width characters
+    with a continuation indent.
+    """
+    comment_markup = markup[1]
+    lines = []
+    for line in code.expandtabs(4).split('\n'):
+        indent = line[:len(line) - len(line.lstrip())]
+        pieces = [line]
+        if width and len(line) > width:
+            continuation_indent = (indent + '    ')[:width // 2]
+            # Break at whitespace only, '-' is an operator in Structured Text
+            pieces = textwrap.wrap(line, width, subsequent_indent=continuation_indent,
+                                   break_on_hyphens=False, break_long_words=True) or [line]
+        in_comment = False
+        for piece in pieces:
+            piece_indent = piece[:len(piece) - len(piece.lstrip())]
+            if in_comment:
+                # The rest of a broken comment line is still part of the comment
+                lines.append(piece_indent + comment_markup.format(piece.strip().translate(XML_ESCAPE_TABLE)))
+            else:
+                lines.append(piece_indent + highlight_line(piece, markup))
+                in_comment = '//' in piece
+    return '\n'.join(lines)
+
+@lru_cache(maxsize=None)
+def local_name(tag):
+    """Return a tag without its namespace, cached since files share few distinct tags."""
+    return tag.rpartition('}')[2]
+
+def get_object_title(obj_type, attrib, file_path):
+    """Build the section title for a TwinCAT object from its root element."""
+    if obj_type == 'POU':
+        obj_name = attrib.get('Name', 'Unknown')
+        pou_type = attrib.get('SpecialFunc', '')
+        return f"{obj_type}: {obj_name} {pou_type}"
+    elif obj_type == 'Itf':
+        obj_name = attrib.get('Name', 'Unknown')
+        return f"Interface: {obj_name}"
+    elif obj_type == 'DUT':
+        obj_name = attrib.get('Name', 'Unknown')
+        return f"DUT: {obj_name}"
+    elif obj_type == 'GVL':
+        obj_name = attrib.get('Name', 'Unknown')
+        return f"GVL: {obj_name}"
+    return os.path.basename(file_path)
+
+def release_element(elem):
+    """Free an element that has been fully processed to keep memory bounded."""
+    elem.clear()
+    if HAS_LXML:
+        # Also drop the already processed siblings still referenced by the parent,
+        # the root has none but may follow a comment or processing instruction
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
 
 def extract_twincat_code(file_path):
     """Extract complete TwinCAT code including methods and properties from XML file."""
     try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        
-        # Try to get object name and type
-        obj_type = root.tag.split('}')[-1]  # Extract tag without namespace
-        
-        if obj_type == 'POU':
-            obj_name = root.attrib.get('Name', 'Unknown')
-            pou_type = root.attrib.get('SpecialFunc', '')
-            title = f"{obj_type}: {obj_name} {pou_type}"
-        elif obj_type == 'Itf':
-            obj_name = root.attrib.get('Name', 'Unknown')
-            title = f"Interface: {obj_name}"
-        elif obj_type == 'DUT':
-            obj_name = root.attrib.get('Name', 'Unknown')
-            title = f"DUT: {obj_name}"
-        elif obj_type == 'GVL':
-            obj_name = root.attrib.get('Name', 'Unknown')
-            title = f"GVL: {obj_name}"
-        else:
-            title = f"{Path(file_path).name}"
-        
-        # Collect all code segments
-        code_segments = []
+        title = None
+        main_segments = []      # Main declaration and implementation
+        method_segments = []
+        property_segments = []
+        main_decl_found = False
+        main_impl_found = False
         
-        # Get main declaration
-        declaration = root.find(".//Declaration")
-        if declaration is not None and declaration.text:
-            cdata_content = extract_cdata(declaration.text)
-            if cdata_content:
-                code_segments.append(("Declaration", cdata_content))
+        parents = []  # Local names of the currently open elements
+        context = []  # Open Method/Property/Get/Set elements as (kind, label, depth)
         
-        # Get implementation
-        implementation = root.find(".//Implementation/ST")
-        if implementation is not None and implementation.text:
-            cdata_content = extract_cdata(implementation.text)
-            if cdata_content:
-                code_segments.append(("Implementation", cdata_content))
-        
-        # Get methods
-        methods = root.findall(".//Method")
-        for method in methods:
-            method_name = method.attrib.get('Name', 'Unknown')
-            method_decl = method.find("Declaration")
-            method_impl = method.find("Implementation/ST")
-            
-            if method_decl is not None and method_decl.text:
-                method_decl_content = extract_cdata(method_decl.text)
-                if method_decl_content:
-                    code_segments.append((f"Method {method_name} Declaration", method_decl_content))
+        # Single streaming pass over the file instead of several tree-wide searches
+        for event, elem in ET.iterparse(file_path, events=("start", "end")):
+            tag = local_name(elem.tag)
             
-            if method_impl is not None and method_impl.text:
-                method_impl_content = extract_cdata(method_impl.text)
-                if method_impl_content:
-                    code_segments.append((f"Method {method_name} Implementation", method_impl_content))
-        
-        # Get properties
-        properties = root.findall(".//Property")
-        for prop in properties:
-            prop_name = prop.attrib.get('Name', 'Unknown')
-            prop_decl = prop.find("Declaration")
+            if event == "start":
+                depth = len(parents)
+                if title is None:
+                    # Try to get object name and type from the root element
+                    title = get_object_title(tag, elem.attrib, file_path)
+                elif tag == 'Method':
+                    context.append((tag, f"Method {elem.attrib.get('Name', 'Unknown')}", depth))
+                elif tag == 'Property':
+                    context.append((tag, f"Property {elem.attrib.get('Name', 'Unknown')}", depth))
+                elif tag in ('Get', 'Set') and context and context[-1][0] == 'Property' \
+                        and context[-1][2] == depth - 1:
+                    context.append((tag, f"{context[-1][1]} {tag}", depth))
+                parents.append(tag)
+                continue
             
-            if prop_decl is not None and prop_decl.text:
-                prop_decl_content = extract_cdata(prop_decl.text)
-                if prop_decl_content:
-                    code_segments.append((f"Property {prop_name} Declaration", prop_decl_content))
+            parents.pop()
+            depth = len(parents)
             
-            # Get and set methods
-            get_method = prop.find("Get")
-            set_method = prop.find("Set")
-            
-            if get_method is not None:
-                get_decl = get_method.find("Declaration")
-                get_impl = get_method.find("Implementation/ST")
+            if tag == 'Declaration' or (tag == 'ST' and parents and parents[-1] == 'Implementation'):
+                content = extract_cdata(elem.text)
+                kind = "Declaration" if tag == 'Declaration' else "Implementation"
                 
-                if get_decl is not None and get_decl.text:
-                    get_decl_content = extract_cdata(get_decl.text)
-                    if get_decl_content:
-                        code_segments.append((f"Property {prop_name} Get Declaration", get_decl_content))
+                # The first declaration and implementation belong to the object itself
+                if kind == "Declaration" and not main_decl_found:
+                    main_decl_found = True
+                    if content:
+                        main_segments.append((kind, content))
+                elif kind == "Implementation" and not main_impl_found:
+                    main_impl_found = True
+                    if content:
+                        main_segments.append((kind, content))
                 
-                if get_impl is not None and get_impl.text:
-                    get_impl_content = extract_cdata(get_impl.text)
-                    if get_impl_content:
-                        code_segments.append((f"Property {prop_name} Get Implementation", get_impl_content))
+                # Declarations sit directly below their Method/Property, ST below Implementation
+                offset = 1 if kind == "Declaration" else 2
+                if context and context[-1][2] == depth - offset and content:
+                    ctx_kind, ctx_label, _ = context[-1]
+                    segments = method_segments if ctx_kind == 'Method' else property_segments
+                    segments.append((f"{ctx_label} {kind}", content))
+            elif context and context[-1][2] == depth and tag == context[-1][0]:
+                context.pop()
             
-            if set_method is not None:
-                set_decl = set_method.find("Declaration")
-                set_impl = set_method.find("Implementation/ST")
-                
-                if set_decl is not None and set_decl.text:
-                    set_decl_content = extract_cdata(set_decl.text)
-                    if set_decl_content:
-                        code_segments.append((f"Property {prop_name} Set Declaration", set_decl_content))
-                
-                if set_impl is not None and set_impl.text:
-                    set_impl_content = extract_cdata(set_impl.text)
-                    if set_impl_content:
-                        code_segments.append((f"Property {prop_name} Set Implementation", set_impl_content))
+            release_element(elem)
         
-        return title, code_segments
+        return title, main_segments + method_segments + property_segments
     
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
         return None, None
 
+def extract_twincat_files(file_paths):
+    """Extract a batch of files in one worker task, a task per file costs more than parsing it."""
+    return [extract_twincat_code(file_path) for file_path in file_paths]
+
 def extract_cdata(text):
-    """Extract content from CDATA section."""
-    if text:
-        cdata_pattern = r'<!\[CDATA\[(.*?)\]\]>'
-        match = re.search(cdata_pattern, text, re.DOTALL)
-        if match:
-            return match.group(1).strip()
-        # If no CDATA tags, return the text directly (sometimes TwinCAT files don't use CDATA)
-        return text.strip()
-    return None
-
-def is_twincat_file(file_path):
-    """Check if file is a TwinCAT PLC file."""
-    extensions = ['.TcPOU', '.TcDUT', '.TcGVL', '.TcIO']
-    return file_path.suffix in extensions
-
-def collect_files(input_folder):
-    """Collect all TwinCAT files and maintain folder structure."""
-    files_by_folder = {}
-    for root, _, files in os.walk(input_folder):
-        for file in files:
-            file_path = Path(root) / file
-            if is_twincat_file(file_path):
-                relative_path = file_path.relative_to(input_folder)
-                folder_path = relative_path.parent
-                if folder_path not in files_by_folder:
-                    files_by_folder[folder_path] = []
-                files_by_folder[folder_path].append(file_path)
-    return files_by_folder
+    """Extract content from CDATA section (the XML parser already strips the CDATA markers)."""
+    return text.strip() if text else None
+
+def collect_files(input_folder, folder_path='.'):
+    """Yield all TwinCAT files as (folder, file path) while walking the folder structure."""
+    subfolders = []
+    try:
+        entries = os.scandir(input_folder)
+    except OSError:
+        if folder_path == '.':
+            raise
+        return  # Skip subfolders that cannot be read, like os.walk does
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subfolders.append(entry)
+            elif entry.name.endswith(TWINCAT_EXTENSIONS):
+                yield folder_path, entry.path
+    # Files of a folder come before the files of its subfolders
+    for entry in subfolders:
+        subfolder_path = entry.name if folder_path == '.' else os.path.join(folder_path, entry.name)
+        yield from collect_files(entry.path, subfolder_path)
+
+# Paragraph styles are created once at import and reused for every PDF
+STYLES = getSampleStyleSheet()
+STYLES.add(ParagraphStyle(
+    name='CodeStyle',
+    fontName='Courier',
+    fontSize=7,
+    leading=10,
+    spaceAfter=0,
+    spaceBefore=0
+))
+
+STYLES.add(ParagraphStyle(
+    name='Heading',
+    fontName='Helvetica-Bold',
+    fontSize=14,
+    spaceAfter=12,
+    spaceBefore=6,
+    textColor=colors.black
+))
+
+STYLES.add(ParagraphStyle(
+    name='Subheading',
+    fontName='Helvetica-Bold',
+    fontSize=12,
+    spaceAfter=6,
+    spaceBefore=6,
+    textColor=colors.black
+))
+
+TITLE_STYLE = ParagraphStyle(
+    name='Title',
+    fontName='Helvetica-Bold',
+    fontSize=24,
+    alignment=1,  # Center
+    spaceAfter=30,
+    textColor=colors.black
+)
+
+# Characters of the monospaced code font that fit in the frame, which has 6pt
+# padding on each side within the page margins
+CODE_LINE_WIDTH = int((A4[0] - 4*cm - 2*6) // stringWidth(' ', STYLES['CodeStyle'].fontName, STYLES['CodeStyle'].fontSize))
+
+class FlowableStream:
+    """List-like view of a flowable generator for doc.build.
+
+    reportlab consumes the story from the front (len, indexing, del, insert),
+    so only a few flowables have to exist at a time.
+    """
+    
+    def __init__(self, flowables, lookahead=16):
+        self._source = iter(flowables)
+        self._buffer = []
+        self._lookahead = lookahead
+    
+    def _fill(self):
+        """Pull flowables from the generator until the lookahead is buffered."""
+        while self._source is not None and len(self._buffer) < self._lookahead:
+            try:
+                self._buffer.append(next(self._source))
+            except StopIteration:
+                self._source = None
+    
+    def __len__(self):
+        self._fill()
+        return len(self._buffer)
+    
+    def __getitem__(self, index):
+        self._fill()
+        return self._buffer[index]
+    
+    def __setitem__(self, index, value):
+        self._buffer[index] = value
+    
+    def __delitem__(self, index):
+        del self._buffer[index]
+    
+    def insert(self, index, value):
+        self._buffer.insert(index, value)
+
+def get_chapters(code_files_by_folder):
+    """Flatten the folders and their files into a numbered list of chapters.
+    
+    Each chapter is (depth, number, title, code_segments), code_segments is None for folders.
+    """
+    chapters = []
+    for idx, (folder, files) in enumerate(code_files_by_folder.items(), 1):
+        chapters.append((0, f"{idx}", folder, None))
+        for file_index, (title, code_segments) in enumerate(files, 1):
+            chapters.append((1, f"{idx}.{file_index}", title, code_segments))
+    return chapters
 
 def generate_pdf(code_files_by_folder, output_pdf):
     """Generate PDF from the extracted code files."""
@@ -168,177 +335,166 @@ def generate_pdf(code_files_by_folder, output_pdf):
         bottomMargin=2*cm
     )
     
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(
-        name='CodeStyle',
-        fontName='Courier',
-        fontSize=7,
-        leading=10,
-        spaceAfter=0,
-        spaceBefore=0
-    ))
+    chapters = get_chapters(code_files_by_folder)
     
-    styles.add(ParagraphStyle(
-        name='Heading',
-        fontName='Helvetica-Bold',
-        fontSize=14,
-        spaceAfter=12,
-        spaceBefore=6,
-        textColor=colors.black
-    ))
+    # Add each code file organized by folder
+    def add_code_files():
+        """Yield the code files of each folder as flowables."""
+        FirstCycleDone=0
+        for depth, number, title, code_segments in chapters:
+            if depth == 0:
+                if FirstCycleDone:
+                    yield PageBreak()
+                FirstCycleDone=1
+                yield Paragraph(f"{number} {title}", STYLES['Heading'])
+                continue
+            
+            yield Paragraph(f"{number} {title}", STYLES['Subheading'])
+            for segment_title, code in code_segments:
+                yield Paragraph(segment_title, STYLES['Subheading'])
+                # One preformatted flowable per segment, its markup is parsed only once
+                # XPreformatted never wraps, so long lines are broken at the page width
+                yield XPreformatted(highlight_code(code, width=CODE_LINE_WIDTH), STYLES['CodeStyle'])
+                yield Spacer(1, 0.5*cm)
     
-    styles.add(ParagraphStyle(
-        name='Subheading',
-        fontName='Helvetica-Bold',
-        fontSize=12,
-        spaceAfter=6,
-        spaceBefore=6,
-        textColor=colors.black
-    ))
-
-    title_style = ParagraphStyle(
-        name='Title',
-        fontName='Helvetica-Bold',
-        fontSize=24,
-        alignment=1,  # Center
-        spaceAfter=30,
-        textColor=colors.black
-    )
+    def build_elements():
+        """Yield all flowables of the document in order."""
+        # Add title page
+        yield Spacer(1, 5*cm)
+        yield Paragraph("TwinCAT PLC PDF Auto-Gen", TITLE_STYLE)
+        yield Spacer(1, 1*cm)
+        yield Paragraph(f"Generated on: {os.path.basename(os.path.dirname(output_pdf))}", 
+                        STYLES['Normal'])
+        yield Paragraph(f"Total files: {len(code_files_by_folder)}", STYLES['Normal'])
+        yield PageBreak()
+        
+        # Add table of contents
+        yield Paragraph("Table of Contents", STYLES['Heading'])
+        yield Spacer(1, 0.5*cm)
+        
+        toc_data = [[f"{'    ' * depth}{number} {title}"] for depth, number, title, _ in chapters]
+        toc = Table(toc_data, colWidths=[450])
+        toc.setStyle(TableStyle([('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
+                                 ('FONTSIZE', (0,0), (-1,-1), 10),
+                                 ('LEADING', (0,0), (-1,-1), 14)]))
+        yield toc
+        yield PageBreak()
+        
+        yield from add_code_files()  # Add the actual code files
     
-    elements = []
+    # Flowables are created while the document is built instead of all up front
+    doc.build(FlowableStream(build_elements()))
+    print(f"PDF generated successfully: {output_pdf}")
+
+# Style sheet of the HTML rendered by WeasyPrint, mirrors the reportlab styles
+HTML_STYLE = """
+@page { size: A4; margin: 2cm; }
+body { font-family: Helvetica, sans-serif; font-size: 10pt; }
+.title { font-size: 24pt; font-weight: bold; text-align: center; margin-top: 5cm; margin-bottom: 30pt; }
+h1 { font-size: 14pt; margin: 6pt 0 12pt 0; }
+h2 { font-size: 12pt; margin: 6pt 0 6pt 0; }
+.folder { page-break-before: always; }
+.toc { page-break-before: always; }
+.toc-entry { line-height: 14pt; white-space: pre; }
+pre { font-family: Courier, monospace; font-size: 7pt; line-height: 10pt; margin: 0 0 0.5cm 0;
+      white-space: pre-wrap; overflow-wrap: anywhere; }
+.kw { color: blue; }
+.cm { color: green; }
+"""
+
+def generate_html_pdf(code_files_by_folder, output_pdf):
+    """Generate PDF from the extracted code files by rendering HTML with WeasyPrint."""
+    parts = [f'<html><head><meta charset="utf-8"><style>{HTML_STYLE}</style></head><body>']
     
     # Add title page
-    elements.append(Spacer(1, 5*cm))
-    elements.append(Paragraph("TwinCAT PLC PDF Auto-Gen", title_style))
-    elements.append(Spacer(1, 1*cm))
-    elements.append(Paragraph(f"Generated on: {os.path.basename(os.path.dirname(output_pdf))}", 
-                             styles['Normal']))
-    elements.append(Paragraph(f"Total files: {len(code_files_by_folder)}", styles['Normal']))
-    elements.append(PageBreak())
-    
-    # Add table of contents
-    elements.append(Paragraph("Table of Contents", styles['Heading']))
-    elements.append(Spacer(1, 0.5*cm))
+    parts.append('<div class="title">TwinCAT PLC PDF Auto-Gen</div>')
+    parts.append(f"<p>Generated on: {os.path.basename(os.path.dirname(output_pdf)).translate(XML_ESCAPE_TABLE)}</p>")
+    parts.append(f"<p>Total files: {len(code_files_by_folder)}</p>")
     
-
-    toc_data = []
+    # Numbered chapters shared by the table of contents and the body
+    chapters = get_chapters(code_files_by_folder)
     
-    def add_to_toc(data, prefix=""):
-        """Recursive function to add items to the Table of Contents."""
-        for idx, (folder, files) in enumerate(data.items()):
-            folder_label = f"{prefix}{idx + 1}"  # Add numbering for this folder level
-            toc_data.append([f"{folder_label} {folder}"])
-            
-            file_index = 1
-            for title, _ in files:
-                toc_data.append([f"    {folder_label}.{file_index} {title}"])
-                file_index += 1
-            
-            # Recursively go deeper if there are subfolders
-            subfolder_index = 1
-            for subfolder, subfiles in data.items():
-                if isinstance(subfiles, dict):  # Only handle subfolders
-                    add_to_toc({subfolder: subfiles}, f"{folder_label}.{subfolder_index}")
-                    subfolder_index += 1
-
-    add_to_toc(code_files_by_folder)  # Generate table of contents
-    toc = Table(toc_data, colWidths=[450])
-    toc.setStyle(TableStyle([('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
-                             ('FONTSIZE', (0,0), (-1,-1), 10),
-                             ('LEADING', (0,0), (-1,-1), 14)]))
-    elements.append(toc)
-    elements.append(PageBreak())
+    # Add table of contents
+    parts.append('<h1 class="toc">Table of Contents</h1>')
+    for depth, number, title, _ in chapters:
+        parts.append(f'<div class="toc-entry">{"    " * depth}{number} {title.translate(XML_ESCAPE_TABLE)}</div>')
     
     # Add each code file organized by folder
-    def add_code_files(data, prefix=""):
-        """Recursive function to add code files to the PDF."""
-        FirstCycleDone=0
-        for idx, (folder, files) in enumerate(data.items()):
-            if FirstCycleDone:
-                elements.append(PageBreak()) 
-            FirstCycleDone=1
-            folder_label = f"{prefix}{idx + 1}"  # Add numbering for this folder level
-            elements.append(Paragraph(f"{folder_label} {folder}", styles['Heading']))
-            
-            file_index = 1
-            for title, code_segments in files:
-                elements.append(Paragraph(f"{folder_label}.{file_index} {title}", styles['Subheading']))
-                for segment_title, code in code_segments:
-                    elements.append(Paragraph(segment_title, styles['Subheading']))
-                    code_lines = code.split('\n')
-                    for line in code_lines:
-                        safe_line = line.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                        if safe_line.strip():
-                           keywords = [
-                                '__UXINT', '__XINT', '__XWORD', 'BIT', 'BOOL', 'BYTE', 'DATE', 'DATE_AND_TIME',
-                                'DINT', 'DT', 'DWORD', 'INT', 'LDATE', 'LDATE_AND_TIME', 'LDT', 'LINT',
-                                'LREAL', 'LTIME', 'LTOD', 'LWORD', 'REAL', 'SINT', 'STRING', 'TIME',
-                                'TOD', 'TIME_OF_DAY', 'UDINT', 'UINT', 'ULINT', 'USINT', 'WORD', 'WSTRING',
-                                'FUNCTION_BLOCK', 'PROGRAM', 'IMPLEMENTS', 'INTERFACE', 'VAR', 'END_VAR', 'EXTENDS',
-                                'PROPERTY', 'TYPE', 'END_TYPE', 'STRUCT', 'END_STRUCT', 'POINTER', 'TO', 'DO',
-                                'FOR', 'END_FOR', 'END_IF', 'IF', 'AND', 'AND_THEN', 'OR_ELSE', 'ELSE', 'WHILE',
-                                'REPEAT', 'UNTIL', 'CASE', 'OF', 'ADR', 'XOR', 'VAR_INPUT', 'VAR_OUTPUT', 'PERSISTENT','UPPER_BOUND',
-                                'RETAIN', 'AT', 'ARRAY', 'OF', 'METHOD', 'THIS', 'NOT', 'THEN', 'ELSIF', 'LOWER_BOUND',
-                                'REFERENCE', 'REF=', 'PUBLIC', 'PRIVATE', 'CONSTANT', 'VAR_GLOBAL', 'RETURN','VAR_IN_OUT', 'EXIT',
-                                'END_CASE','FUNCTION'
-                           ]   
-                           if "//" in line:
-                                code_part, comment_part = line.split("//", 1)
-                                for keyword in keywords:
-                                    code_part = re.sub(
-                                        rf'\b{keyword}\b',
-                                        lambda m: f'<font color="blue">{m.group(0)}</font>',
-                                        code_part
-                                    )
-                                full_line = code_part + f'<font color="green">//{comment_part}</font>'
-                                elements.append(Paragraph(full_line.strip(), styles['CodeStyle']))
-                           else:
-                                highlighted = safe_line
-                                for keyword in keywords:
-                                    highlighted = re.sub(
-                                        rf'\b{keyword}\b',
-                                        lambda m: f'<font color="blue">{m.group(0)}</font>',
-                                        highlighted
-                                    )
- 
-                                elements.append(Paragraph(highlighted.strip(), styles['CodeStyle']))
-                        else:
-                            elements.append(Spacer(1, 10))
-                    elements.append(Spacer(1, 0.5*cm))
-                file_index += 1
-            
-            subfolder_index = 1
-            for subfolder, subfiles in data.items():
-                if isinstance(subfiles, dict): 
-                    add_code_files({subfolder: subfiles}, f"{folder_label}.{subfolder_index}")
-                    subfolder_index += 1
+    for depth, number, title, code_segments in chapters:
+        if depth == 0:
+            parts.append(f'<h1 class="folder">{number} {title.translate(XML_ESCAPE_TABLE)}</h1>')
+            continue
+        parts.append(f"<h2>{number} {title.translate(XML_ESCAPE_TABLE)}</h2>")
+        for segment_title, code in code_segments:
+            parts.append(f"<h2>{segment_title.translate(XML_ESCAPE_TABLE)}</h2>")
+            parts.append('<pre><code>' + highlight_code(code, HTML_MARKUP) + '</code></pre>')
+    parts.append('</body></html>')
     
-    add_code_files(code_files_by_folder)  # Add the actual code files
-    doc.build(elements)
+    # Temporary file so no existing HTML file next to the PDF is overwritten
+    html_fd, html_path = tempfile.mkstemp(suffix='.html')
+    try:
+        with os.fdopen(html_fd, 'w', encoding='utf-8') as html_file:
+            html_file.write('\n'.join(parts))
+        subprocess.run(['weasyprint', html_path, output_pdf], check=True)
+    except FileNotFoundError:
+        print("Error: weasyprint not found, install it or run without --fast")
+        sys.exit(1)
+    except subprocess.CalledProcessError as e:
+        print(f"Error running weasyprint: {e}")
+        sys.exit(1)
+    finally:
+        os.remove(html_path)
     print(f"PDF generated successfully: {output_pdf}")
 
+def check_reportlab_accelerator():
+    """Warn if reportlab has to run without its C accelerator (_rl_accel)."""
+    if importlib.util.find_spec('_rl_accel') is None:
+        print("Warning: reportlab C accelerator not found, install 'reportlab[accel]' for faster PDF generation")
+
 def main():
-    if len(sys.argv) < 3:
-        print("Usage: python twincat_code_extractor.py <input_folder> <output_pdf>")
+    # --fast renders the PDF from HTML with WeasyPrint instead of reportlab
+    fast = '--fast' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != '--fast']
+    if len(args) < 2:
+        print("Usage: python twincat_code_extractor.py [--fast] <input_folder> <output_pdf>")
         sys.exit(1)
     
-    input_folder = sys.argv[1]
-    output_pdf = sys.argv[2]
+    if not fast:
+        check_reportlab_accelerator()
     
-    # Collect all TwinCAT files by folder
-    code_files_by_folder = collect_files(input_folder)
+    input_folder = args[0]
+    output_pdf = args[1]
     
-    print(f"Found {sum(len(files) for files in code_files_by_folder.values())} TwinCAT files")
+    code_files_by_folder = {}
+    futures = {}
+    batch = []  # (folder, index, file path) of files not yet submitted
+    file_count = 0
     
-    # Extract code from files
-    for folder, files in code_files_by_folder.items():
-        for i, file_path in enumerate(files):
-            title, code_segments = extract_twincat_code(file_path)
-            if title and code_segments:
-                files[i] = (title, code_segments)
+    # Start extracting batches of TwinCAT files as soon as the folder walk finds them
+    with ProcessPoolExecutor() as executor:
+        for folder, file_path in collect_files(input_folder):
+            files = code_files_by_folder.setdefault(folder, [])
+            batch.append((folder, len(files), file_path))
+            files.append(file_path)
+            file_count += 1
+            if len(batch) == EXTRACT_BATCH_SIZE:
+                futures[executor.submit(extract_twincat_files, [path for _, _, path in batch])] = batch
+                batch = []
+        if batch:
+            futures[executor.submit(extract_twincat_files, [path for _, _, path in batch])] = batch
+        
+        print(f"Found {file_count} TwinCAT files")
+        
+        for future in as_completed(futures):
+            for (folder, i, _), (title, code_segments) in zip(futures[future], future.result()):
+                if title and code_segments:
+                    code_files_by_folder[folder][i] = (title, code_segments)
     
     # Generate PDF with folder structure
-    generate_pdf(code_files_by_folder, output_pdf)
+    if fast:
+        generate_html_pdf(code_files_by_folder, output_pdf)
+    else:
+        generate_pdf(code_files_by_folder, output_pdf)
 
 if __name__ == "__main__":
     main()